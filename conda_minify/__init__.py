@@ -1,2 +1,15 @@
-from .environment import CondaEnvironment
-from .__version__ import __version__
\ No newline at end of file
+import sys
+from .__version__ import __version__
+from .how import How
+
+if sys.version_info >= (3, 7):
+    # defer loading the environment stack (conda, yaml) until it is used so
+    # that the CLI can render help and argument errors cheaply
+    def __getattr__(name):
+        if name == 'CondaEnvironment':
+            from .environment import CondaEnvironment
+            return CondaEnvironment
+        raise AttributeError(
+            'module {0!r} has no attribute {1!r}'.format(__name__, name))
+else:
+    from .environment import CondaEnvironment
\ No newline at end of file
@@ -1,18 +1,77 @@
 import argparse
 import sys
 import os
+import re
 import textwrap as _textwrap
 from argparse import HelpFormatter
-from .environment import CondaEnvironment
+from functools import lru_cache, partial
 from .__version__ import __version__
+from .how import How
 
+_PATH_SEP_RE = re.compile(r'[\\/]')
+_DEFAULT_ENV_PATH = os.path.dirname(sys.executable)
+# help strings are dropped under `python -OO`, the same as docstrings
+_STRIP_HELP = sys.flags.optimize >= 2
+
+
+@lru_cache(maxsize=256)
+def _wrap(text, width):
+    """
+    Wraps each line of `text` to `width`, preserving explicit line breaks.
+
+    :returns: [tuple] the wrapped lines.
+    """
+    out = []
+    for t in text.splitlines():
+        out.extend(_textwrap.wrap(t, width))
+    return tuple(out)
+
+def _h(text):
+    """Returns the help `text`, or None when running under `python -OO`."""
+    return None if _STRIP_HELP else text
+
+def _default_cache_dir():
+    """Returns the per-user cache directory for conda-minify."""
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = (os.environ.get('XDG_CACHE_HOME') 
+            or os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(base, 'conda-minify')
+
+def _how_type(value):
+    """Converts a CLI value to a How member for argparse."""
+    try:
+        return How.parse(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            'invalid choice: {0!r} (choose from {1})'.format(
+                value, ', '.join(repr(str(h)) for h in How)
+            )
+        )
 
 class MyFormatter(HelpFormatter):
     def _split_lines(self, text, width):
-        return [w for t in text.splitlines() 
-                    for w in _textwrap.wrap(t, width)]
+        return list(_wrap(text, width))
 
-def main():
+class ExtendAction(argparse.Action):
+    """
+    Extends the destination list with every value passed to the option,
+    mirroring the `extend` action added to argparse in Python 3.8.
+    """
+    def __call__(self, parser, namespace, values, option_string=None):
+        items = list(getattr(namespace, self.dest, None) or [])
+        items.extend(values)
+        setattr(namespace, self.dest, items)
+
+@lru_cache(maxsize=1)
+def _build_parser():
+    """
+    Builds the argument parser for the CLI.  The parser is only constructed
+    once per process and reused on subsequent calls.
+
+    :returns: [argparse.ArgumentParser]
+    """
     parser = argparse.ArgumentParser(
         prog='conda-minify (v {})'.format(__version__),
         description='Builds minimized Conda specs to share environments.',
@@ -21,16 +80,17 @@ def main():
         title=':==== Main arguments ====',
         description='Options available to all methods within conda-minify.')
     main_group.add_argument('--name', '-n',
-        help='The environment name to export. Defaults to using the current '
-            'environment.  Including a forward or backslash will be '
-            "interpretted as the environment's path.")
+        help=_h('The environment name to export. Defaults to using the '
+            'current environment.  Including a forward or backslash will be '
+            "interpretted as the environment's path."))
     main_group.add_argument('--relax', 
         action='store_true', 
-        help='Switches to using the relax API to export the entire '
-            'environment specs with relaxed versioning numbers.')
+        help=_h('Switches to using the relax API to export the entire '
+            'environment specs with relaxed versioning numbers.'))
     main_group.add_argument('--how',
-        choices=['full', 'major', 'minor', 'none'],
-        help='(default: full)\nThe method for how requirement versions are '
+        type=_how_type,
+        choices=list(How),
+        help=_h('(default: full)\nThe method for how requirement versions are '
             'added to the spec.\n'
             "- 'full': Include the exact version\n"
             "- 'major': Include the major value only ('1.*')\n"
@@ -38,75 +98,112 @@ def main():
             "- 'none': Version is omitted\n"
             'NOTE:\nWhen using the --relax option:\n  1. The --pin and '
             '--override arguments takes precedence over this value.\n'
-            "  2. The default for --relax is 'minor'")
+            "  2. The default for --relax is 'minor'"))
     main_group.add_argument('-f', '--file', default=None,
-        help='The file path for export.  Default prints output to screen.')
+        help=_h('The file path for export.  Default prints output to screen.'))
+    main_group.add_argument('--no_cache', action='store_true',
+        help=_h('Re-read all of the package metadata instead of using the '
+            'cache from a previous run on the unchanged environment.'))
 
     minify_group = parser.add_argument_group(
         title=':==== Minify arguments ====',
         description='Options exclusively available when using MINIFY (the '
             'default) to export an environment specification.  These are '
             'ignored when --relax is passed.')
-    minify_group.add_argument('-i', '--include', action='append',
-        help='Additional ackages to include in the spec.  Can be passed '
-            'multiple times:\n  ... -i pkg1 -i pkg2')
-    minify_group.add_argument('-e', '--exclude', action='append', 
-        help='Packages to exclude from the spec.  Can be passed multiple '
-            'times:\n  ... -e pkg1 -e pkg2')
+    minify_group.add_argument('-i', '--include', action=ExtendAction,
+        nargs='+', default=[],
+        help=_h('Additional ackages to include in the spec.  Takes one or '
+            'more packages and can be passed multiple times:\n'
+            '  ... -i pkg1 pkg2 -i pkg3'))
+    minify_group.add_argument('-e', '--exclude', action=ExtendAction,
+        nargs='+', default=[],
+        help=_h('Packages to exclude from the spec.  Takes one or more '
+            'packages and can be passed multiple times:\n'
+            '  ... -e pkg1 pkg2 -e pkg3'))
     minify_group.add_argument('--add_exclusion_deps', action='store_true',
-        help='Whether to add dependencies of excluded packages to the '
+        help=_h('Whether to add dependencies of excluded packages to the '
             'minified spec.  E.g. using:n'
             '  ... --exclude pandas --add_exclusion_deps\n' 
             'removes pandas from the spec, but adds numpy, python_dateutil, '
-            'and pytz - the next level of dependencies for pandas.')
+            'and pytz - the next level of dependencies for pandas.'))
     minify_group.add_argument('--add_builds', action='store_true', 
-        help='Add the build number to the requirment. This is highly '
-            'specific and will override loosening of version requirements.')
+        help=_h('Add the build number to the requirment. This is highly '
+            'specific and will override loosening of version requirements.'))
 
     relax_group = parser.add_argument_group(
         title=':==== Relax arguments ====',
         description='Options exclusively available when using RELAX (via '
             '--relax).  These are ignored unless --relax is passed.')
-    relax_group.add_argument('-p', '--pin', action='append',
-        help='Pins package version to full version. Packages not in the '
-            'environment are ignored.  Can be passed multiple times:\n'
-            '  ... -p numpy -p pandas\n')
+    relax_group.add_argument('-p', '--pin', action=ExtendAction,
+        nargs='+', default=[],
+        help=_h('Pins package version to full version. Packages not in the '
+            'environment are ignored.  Takes one or more packages and can be '
+            'passed multiple times:\n  ... -p numpy pandas -p scipy\n'))
     relax_group.add_argument('-o', '--override', action='append', nargs=2,
-        help='Overrides the default `how` setting for any package. '
+        help=_h('Overrides the default `how` setting for any package. '
             'Takes 2 arguments, package name and new `how` method. Can be '
             'passed multiple times:\n'
-            '  ... --how major -o pandas full -o numpy major')
+            '  ... --how major -o pandas full -o numpy major'))
 
-    # if len(sys.argv) <= 1:
-    #     parser.print_help(sys.stderr)
-    #     sys.exit(1)
+    return parser
 
-    args = parser.parse_args()
+def _write_stdout(text):
+    """
+    Writes `text` plus a trailing newline to stdout as a single encoded write,
+    falling back to the text layer when stdout has no binary buffer.
+    """
+    out = getattr(sys.stdout, 'buffer', None)
+    if out is None:
+        sys.stdout.write(text + '\n')
+        sys.stdout.flush()
+        return
+    out.write(text.encode('utf-8') + b'\n')
+    out.flush()
+
+def run(args):
+    """
+    Exports the environment spec described by the parsed CLI `args`.
+
+    :args: [argparse.Namespace] the arguments returned by the CLI parser.
+    """
     # check for name and path characters in name
     if not args.name:
-        args.path = os.path.dirname(sys.executable)
-    elif ('/' in args.name) or ('\\' in args.name):
+        args.path = _DEFAULT_ENV_PATH
+    elif _PATH_SEP_RE.search(args.name):
         args.path = args.name
     else:
         args.path = None
 
     # set how defaults
-    if not args.how:
-        args.how = 'minor' if args.relax else 'full'
+    if args.how is None:
+        args.how = How.MINOR if args.relax else How.FULL
 
-    cenv = CondaEnvironment(args.name, args.path)
+    # build the overrides, rejecting packages passed more than once
+    override = None
+    if args.override:
+        override = {}
+        for pkg, how in args.override:
+            if pkg in override:
+                _build_parser().error('argument -o/--override: the package '
+                    '"{}" was passed more than once'.format(pkg))
+            try:
+                override[pkg] = _how_type(how)
+            except argparse.ArgumentTypeError as e:
+                _build_parser().error('argument -o/--override: {}'.format(e))
+
+    from .environment import CondaEnvironment
+    cache_dir = None if args.no_cache else _default_cache_dir()
+    cenv = CondaEnvironment(args.name, args.path, cache_dir=cache_dir)
     cenv.build_graph()
 
     if args.relax:
-        yaml_str = cenv.relax_requirements(
-            export_path=args.file,
+        export = partial(cenv.relax_requirements,
             how=args.how,
             pin=args.pin,
-            override=dict(args.override) if args.override else None
+            override=override
         )
     else:
-        yaml_str = cenv.minify_requirements(
-            export_path=args.file,
+        export = partial(cenv.minify_requirements,
             include=args.include,
             exclude=args.exclude,
             add_exclusion_deps=args.add_exclusion_deps,
@@ -115,8 +212,25 @@ def main():
         )
 
     if args.file:
+        # stream the YAML into a temporary file next to the target, and only
+        # replace the target once the export has succeeded
+        tmp = '{0}.{1}.tmp'.format(args.file, os.getpid())
+        try:
+            with open(tmp, 'w', buffering=1 << 16, encoding='utf8') as fp:
+                export(export_fp=fp)
+            os.replace(tmp, args.file)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
         print('Minified environment specification written to '
             '"{}"'.format(args.file))
     else:
-        print(yaml_str)
-        
\ No newline at end of file
+        _write_stdout(export())
+
+def main():
+    parser = _build_parser()
+    args = parser.parse_args()
+    run(args)
\ No newline at end of file
@@ -1,11 +1,50 @@
+import hashlib
+import json
+import os
 import pathlib
+import re
 import sys
-import json
 import yaml
-from collections import defaultdict
+from collections import defaultdict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import product, takewhile
+from types import MappingProxyType
 from conda.cli.python_api import run_command
-from conda.exceptions import EnvironmentLocationNotFound
+from conda.models.channel import Channel
+try:
+    from conda.base.context import context as _context
+    from conda.base.context import locate_prefix_by_name, reset_context
+except ImportError:
+    # older Conda versions, fall back to running conda commands
+    _context = locate_prefix_by_name = reset_context = None
+from .__version__ import __version__
 from .graph import DirectedAcyclicGraph
+from .how import How
+
+try:
+    from orjson import loads as _json_loads
+except ImportError:
+    from json import loads as _json_loads
+
+try:
+    from yaml import CSafeDumper as _YamlDumper
+except ImportError:
+    from yaml import SafeDumper as _YamlDumper
+
+# the fields of a package needed to write its requirement line
+PkgReq = namedtuple('PkgReq', ['version', 'build_string', 'channel'])
+
+_PYPI_NAME_RE = re.compile(r'[-_.]+')
+_NORM_TRANS = str.maketrans('-.', '__')
+_PYPI_REQ_RE = re.compile(rb'^Requires-(Dist|Python):[ \t]*(.*)$', re.M)
+_PKG_INFO_RE = re.compile(rb'^(Name|Version):[ \t]*(.*)$', re.M)
+# the site-packages entries that Conda reports as PyPi packages
+_PYPI_ANCHORS = ('.dist-info', '.egg-info', '.egg-link', '.egg')
+# scalars that PyYAML writes unquoted, as long as they resolve to strings
+_YAML_PLAIN_RE = re.compile(r'[A-Za-z0-9_][A-Za-z0-9_.*+!=<>-]*\Z', re.A)
+_YAML_RESOLVER = yaml.resolver.Resolver()
+_YAML_STR_TAG = 'tag:yaml.org,2002:str'
 
 
 def format_version(version, how):
@@ -13,74 +52,136 @@ def format_version(version, how):
     Version string formatter for loosening version requirements.
 
     :version: [str] the version strings.
-    :how: [str|bool] how to format the version. 
+    :how: [How|str] how to format the version. 
 
     :returns: [str] formatted version string
     """
-    _how = str(how).lower()
-    allowed = ('full', 'major', 'minor', 'none')
-    if _how not in allowed:
-        raise ValueError(
-            "Argument `how` only accepts the following values: {}".format(
-                allowed
-            )
-        )
+    _how = How.parse(how)
+    if _how is How.FULL:
+        return version
 
-    n = version.count('.')
-    if (n == 0) or (_how == 'full'):
+    parts = version.split('.', 2)
+    if len(parts) == 1:
         return version
-    if n == 1:
-        major, minor = version.split('.')
-        subs = ''
-    if n >= 2:
-        major, minor, subs = version.split('.', 2)
-
-    if _how == 'major':
-        return major + '.*'
-    if _how == 'minor':
-        if not subs:
-            return '{0}.{1}'.format(major, minor)
-        return '{0}.{1}.*'.format(major, minor)
+    if _how is How.MAJOR:
+        return parts[0] + '.*'
+    if _how is How.MINOR:
+        if len(parts) == 2 or not parts[2]:
+            return '{0}.{1}'.format(parts[0], parts[1])
+        return '{0}.{1}.*'.format(parts[0], parts[1])
     return version
 
+@lru_cache(maxsize=1)
+def _get_conda_config():
+    """
+    Reads the full conda configuration with a single Conda call.  The result
+    is cached for the life of the process.
+
+    :returns: [dict] the parsed `conda config --show --json` output.
+    """
+    config_str, _, _ = run_command('config', '--show', '--json')
+    return _json_loads(config_str)
+
+@lru_cache(maxsize=1)
+def _conda_context():
+    """
+    Returns the Conda context loaded from the `.condarc` files and `CONDA_*`
+    variables, or None for older Conda versions.  Conda only builds a bare
+    context at import time, so it is loaded once here the same way that the
+    `conda` commands do.
+    """
+    if _context is None:
+        return None
+    reset_context()
+    return _context
+
 def get_conda_default_channels():
     """
-    Uses the Conda Python API to retrieve the default channels from the conda
+    Uses the Conda context to retrieve the default channels from the conda
     config file.
 
     :returns: [list] the default channels used by the Conda executable.
     """
-    channel_str, _, _ = run_command('config', '--show', 
-        'default_channels', '--json')
-    channels = json.loads(channel_str)
-    return [c.get('name') for c in channels.get('default_channels', [])]
+    context = _conda_context()
+    if context is not None:
+        return [c.name for c in context.default_channels]
+    channels = _get_conda_config().get('default_channels', [])
+    return [c.get('name') for c in channels]
 
+@lru_cache(maxsize=1)
 def get_conda_pkgs_dirs():
     """
-    Uses the Conda Python API to retrieve the `pkgs_dirs` from the conda
-    config file.
+    Uses the Conda context to retrieve the `pkgs_dirs` from the conda
+    config file.  The result is cached for the life of the process, call
+    `clear_conda_config_cache()` to re-read it.
 
-    :returns: [list] pathlib.Path objects for each path.
+    :returns: [tuple] pathlib.Path objects for each path.
     """
-    dirs_str, _, _ = run_command('config', '--show', 'pkgs_dirs', '--json')
-    pkgs_dirs = [
+    context = _conda_context()
+    if context is not None:
+        return tuple(pathlib.Path(p) for p in context.pkgs_dirs)
+    pkgs_dirs = tuple(
         pathlib.Path(p)
         for p in
-        json.loads(dirs_str).get('pkgs_dirs', [])
-    ]
+        _get_conda_config().get('pkgs_dirs', [])
+    )
     return pkgs_dirs
 
-def req_yaml_template(pip=False, version=True, build=False):
+@lru_cache(maxsize=1)
+def get_conda_envs_dirs():
     """
-    Builds a template string for requirement lines in the YAML format.
+    Uses the Conda context to retrieve the `envs_dirs` from the conda
+    config file.  The result is cached for the life of the process, call
+    `clear_conda_config_cache()` to re-read it.
 
-    :pip: [bool] Whether to build a Conda requirement line or a pip line
-    :version: [bool] Includes the version template
-    :build: [bool] Includes the build template.  Makes version "=*" if the 
-        `version` is False for Conda packages.
+    :returns: [tuple] pathlib.Path objects for each path.
+    """
+    context = _conda_context()
+    if context is not None:
+        return tuple(pathlib.Path(p) for p in context.envs_dirs)
+    envs_dirs = tuple(
+        pathlib.Path(p)
+        for p in
+        _get_conda_config().get('envs_dirs', [])
+    )
+    return envs_dirs
 
-    :returns: [str] The requirement string template.
+def clear_conda_config_cache():
+    """
+    Drops the cached Conda configuration, so that the next lookup reloads
+    the Conda context (or re-runs `conda config`) and picks up changes to
+    the `.condarc` files or `CONDA_*` variables.
+    """
+    _get_conda_config.cache_clear()
+    _conda_context.cache_clear()
+    get_conda_pkgs_dirs.cache_clear()
+    get_conda_envs_dirs.cache_clear()
+
+@lru_cache(maxsize=4096)
+def _load_index_json(path, mtime_ns):
     """
+    Parses a package's `index.json` file.  The result is cached on the path
+    and modification time, so environments sharing a `pkgs_dirs` package
+    only decode it once.
+
+    :path: [str] path to the `index.json` file.
+    :mtime_ns: [int] the file's modification time, part of the cache key.
+
+    :returns: [tuple] the (key, value) pairs of the JSON object.  The values
+        are shared by every caller, copy them with `_copy_json` before use.
+    """
+    with open(path, 'rb') as fp:
+        return tuple(_json_loads(fp.read()).items())
+
+def _copy_json(value):
+    """Returns `value` with fresh copies of any nested lists and dicts"""
+    if isinstance(value, list):
+        return [_copy_json(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _copy_json(v) for k, v in value.items()}
+    return value
+
+def _build_req_template(pip, version, build):
     template_str = '{name}'
     if version:
         template_str += '=={version}' if pip else '={version}'
@@ -90,6 +191,74 @@ def req_yaml_template(pip=False, version=True, build=False):
         template_str += '={build_string}'
     return template_str
 
+# every (pip, version, build) combination is built once at import
+_REQ_TEMPLATES = {
+    flags: _build_req_template(*flags)
+    for flags in product((False, True), repeat=3)
+}
+
+def req_yaml_template(pip=False, version=True, build=False):
+    """
+    Returns a template string for requirement lines in the YAML format.
+
+    :pip: [bool] Whether to build a Conda requirement line or a pip line
+    :version: [bool] Includes the version template
+    :build: [bool] Includes the build template.  Makes version "=*" if the 
+        `version` is False for Conda packages.
+
+    :returns: [str] The requirement string template.
+    """
+    return _REQ_TEMPLATES[(bool(pip), bool(version), bool(build))]
+
+def _yaml_plain(value):
+    return (
+        isinstance(value, str) 
+        and _YAML_PLAIN_RE.match(value) is not None
+        and _YAML_RESOLVER.resolve(
+            yaml.ScalarNode, value, (True, False)) == _YAML_STR_TAG
+    )
+
+def _fast_yaml_dump(yaml_data):
+    """
+    Writes the environment spec layout (`name`, `channels`, `dependencies`
+    with an optional `pip` list) directly as YAML, matching `yaml.dump`.
+
+    :yaml_data: [dict] the environment spec.
+
+    :returns: [str|None] the YAML string, or None if any part of the spec
+        would need quoting or another layout, so `yaml.dump` should be used.
+    """
+    if list(yaml_data) != ['name', 'channels', 'dependencies']:
+        return None
+    name = yaml_data['name']
+    channels = yaml_data['channels']
+    dependencies = yaml_data['dependencies']
+    if not (channels and dependencies and _yaml_plain(name)):
+        return None
+
+    lines = ['name: ' + name, 'channels:']
+    for c in channels:
+        if not _yaml_plain(c):
+            return None
+        lines.append('- ' + c)
+    lines.append('dependencies:')
+    for d in dependencies:
+        if isinstance(d, dict):
+            pip = d.get('pip')
+            if list(d) != ['pip'] or not pip:
+                return None
+            lines.append('- pip:')
+            for p in pip:
+                if not _yaml_plain(p):
+                    return None
+                lines.append('  - ' + p)
+        elif _yaml_plain(d):
+            lines.append('- ' + d)
+        else:
+            return None
+    lines.append('')
+    return '\n'.join(lines)
+
 class CondaEnvironment:
     """
     Imports a Conda environment specs and generates a minified version of
@@ -99,8 +268,20 @@ class CondaEnvironment:
     """
 
     _DEFAULT_CHANNELS = frozenset(['pkgs/main', 'pkgs/r', 'pkgs/msys2'])
-
-    def __init__(self, name=None, path=None):
+    # the package fields exposed by `env_packages_info`
+    _INFO_KEYS = (
+        'arch',
+        'build_string', 
+        'channel', 
+        'depends', 
+        #'name',
+        'platform', 
+        'simple_name',
+        'subdir', 
+        'version'
+    )
+
+    def __init__(self, name=None, path=None, cache_dir=None):
         """
         Read in the packages and dependencies for the Conda environment `name`
         or located at `path`.
@@ -109,11 +290,21 @@ class CondaEnvironment:
         :path: [str] the path to the Conda environment, use if the environment 
             is located in a directory not known by Conda.  If `path` is 
             passed, `name` is ignored.
+        :cache_dir: [str|Path] a directory to cache the parsed package
+            metadata in between runs, stored as JSON.  The cache is only
+            reused while the environment is unchanged.  Defaults to no
+            caching.
         """
         self._name = None
         self._path = None
+        self._cache_dir = pathlib.Path(cache_dir) if cache_dir else None
         self._env_packages_info = {}
         self._env_packages_name_map = {}
+        self._env_packages_info_view = None
+        self._conda_name_cache = {}
+        self._env_json = None
+        self._pypi_dist_info = None
+        self._pkgs_index = None
         self._pkgs_dirs = get_conda_pkgs_dirs()
         self.conda_graph = CondaGraph()
         # I am restricing the default channels to those that are defined by
@@ -133,19 +324,26 @@ class CondaEnvironment:
         self.load_package_metadata()
             
     def _init_from_name(self, name):
-        try:
-            header, _, _ = run_command('list', '-n', name, '_NOPACKAGE_')
-        except EnvironmentLocationNotFound:
-            raise
         self._name = name
+        if _conda_context() is not None:
+            # raises EnvironmentNameNotFound for unknown names
+            self._path = pathlib.Path(locate_prefix_by_name(name)).absolute()
+            return
+        for d in get_conda_envs_dirs():
+            path = d / name
+            if (path / 'conda-meta').is_dir():
+                self._path = path.absolute()
+                return
+        # not in any envs_dir (e.g. `base`), let Conda resolve the name
+        header, _, _ = run_command('list', '-n', name, '_NOPACKAGE_')
         self._path = self._parse_list_header(header)
 
     def _init_from_path(self, path):
-        try:
-            header, _, _ = run_command('list', '-p', path, '_NOPACKAGE_')
-        except EnvironmentLocationNotFound:
-            raise
-        path = self._parse_list_header(header)
+        path = pathlib.Path(path).absolute()
+        if not (path / 'conda-meta').is_dir():
+            # let Conda resolve the path or raise EnvironmentLocationNotFound
+            header, _, _ = run_command('list', '-p', str(path), '_NOPACKAGE_')
+            path = self._parse_list_header(header)
         self._name = path.stem
         self._path = path
 
@@ -154,14 +352,240 @@ class CondaEnvironment:
 
     def get_conda_env_json(self):
         """
-        Uses Conda to read the environment specs in json format.  Run if a
-        change to the environment has been made after this object was 
-        initialized.
+        Reads the environment specs in the json format of `conda list`.  The
+        records are read directly from the environment's `conda-meta`
+        directory, falling back to running Conda if it cannot be read.  The 
+        result is cached on the first call; use `refresh_env_json` if a change
+        to the environment has been made after this object was initialized.
 
         :returns: [list] list of dictionaries containing package metadata
         """
-        pkgs_str, _, _ = run_command('list', '-p', self.path, '--json')
-        return json.loads(pkgs_str)
+        if self._env_json is None:
+            try:
+                self._env_json = self._read_conda_meta()
+            except OSError:
+                pkgs_str, _, _ = run_command('list', '-p', self.path, '--json')
+                self._env_json = _json_loads(pkgs_str)
+        return self._env_json
+
+    def _read_conda_meta(self):
+        """
+        Builds the `conda list --json` records from the `conda-meta/*.json`
+        files, plus any PyPi packages in site-packages that Conda does not
+        manage.
+        """
+        records = []
+        managed = set()
+        python_version = None
+        for entry in os.scandir(str(self._path.joinpath('conda-meta'))):
+            if not entry.name.endswith('.json'):
+                continue
+            data = _json_loads(pathlib.Path(entry.path).read_bytes())
+            channel = Channel(data.get('channel', ''))
+            records.append({
+                'base_url': channel.base_url,
+                'build_number': data.get('build_number', 0),
+                'build_string': data.get('build', ''),
+                'channel': channel.name,
+                'dist_name': entry.name[:-5],
+                'name': data.get('name'),
+                'platform': data.get('subdir'),
+                'version': data.get('version')
+            })
+            if data.get('name') == 'python':
+                python_version = data.get('version')
+            # dist-info and egg-info anchors installed by Conda packages
+            for f in data.get('files', []):
+                if '.dist-info/' in f or '.egg' in f:
+                    for part in f.split('/'):
+                        if part.endswith(_PYPI_ANCHORS):
+                            managed.add(part.lower())
+                            break
+
+        site_packages = self._site_packages_path(python_version)
+        if site_packages:
+            base_urls = {}
+            for entry in os.scandir(str(site_packages)):
+                if not entry.name.endswith(_PYPI_ANCHORS):
+                    continue
+                if entry.name.lower() in managed:
+                    continue
+                anchor = self._read_pypi_anchor(entry)
+                if anchor is None:
+                    continue
+                name, version, develop = anchor
+                name = _PYPI_NAME_RE.sub('-', name).lower()
+                channel = '<develop>' if develop else 'pypi'
+                build = 'dev_0' if develop else 'pypi_0'
+                if channel not in base_urls:
+                    base_urls[channel] = Channel(channel).base_url
+                records.append({
+                    'base_url': base_urls[channel],
+                    'build_number': 0,
+                    'build_string': build,
+                    'channel': channel,
+                    'dist_name': '{0}-{1}-{2}'.format(name, version, build),
+                    'name': name,
+                    'platform': 'pypi',
+                    'version': version
+                })
+        return sorted(records, key=lambda r: r.get('name'))
+
+    @staticmethod
+    def _read_pypi_anchor(entry):
+        """
+        Reads the name and version of the PyPi package anchored at the
+        site-packages `entry`, in the same way that `conda list` does.
+
+        :entry: [os.DirEntry] a `.dist-info`, `.egg-info`, `.egg` or
+            `.egg-link` entry.
+
+        :returns: [tuple|None] `(name, version, develop)`, or None if the
+            package metadata cannot be found.
+        """
+        fname = entry.name
+        if fname.endswith('.dist-info'):
+            name, _, version = fname[:-len('.dist-info')].partition('-')
+            return name, version, False
+
+        develop = fname.endswith('.egg-link')
+        if develop:
+            # the link holds the directory of a `pip install -e` project
+            try:
+                with open(entry.path, encoding='utf8') as fp:
+                    target = os.path.join(
+                        os.path.dirname(entry.path), fp.readline().strip())
+                egg_infos = [
+                    e.path for e in os.scandir(target)
+                    if e.name.endswith('.egg-info')
+                ]
+            except OSError:
+                return None
+            if len(egg_infos) != 1:
+                return None
+            pkg_info = egg_infos[0]
+        elif fname.endswith('.egg'):
+            pkg_info = os.path.join(entry.path, 'EGG-INFO')
+        else:
+            pkg_info = entry.path
+        if os.path.isdir(pkg_info):
+            pkg_info = os.path.join(pkg_info, 'PKG-INFO')
+
+        try:
+            with open(pkg_info, 'rb') as fp:
+                header = b''.join(takewhile(bytes.strip, fp))
+        except OSError:
+            return None
+        fields = {
+            k.decode('utf8'): v.decode('utf8').strip()
+            for k, v in _PKG_INFO_RE.findall(header)
+        }
+        if not (fields.get('Name') and fields.get('Version')):
+            return None
+        return fields['Name'], fields['Version'], develop
+
+    def _site_packages_path(self, python_version):
+        """
+        Returns the site-packages directory for the environment's Python, or
+        None if it does not exist.  Probes the exact Unix and Windows layouts
+        rather than searching for them.
+        """
+        candidates = []
+        if python_version:
+            major_minor = '.'.join(python_version.split('.')[:2])
+            candidates.append(self._path.joinpath(
+                'lib', 'python' + major_minor, 'site-packages'))
+        candidates.append(self._path.joinpath('Lib', 'site-packages'))
+        if os.name == 'nt':
+            candidates.reverse()
+        for path in candidates:
+            if path.is_dir():
+                return path
+        return None
+
+    def _metadata_signature(self):
+        """
+        Hashes the sizes and modification times of the `conda-meta` records
+        and the site-packages directory, which change whenever a package is
+        added, removed or updated.
+        """
+        h = hashlib.sha256()
+        h.update('{0}\0{1}\0{2}'.format(
+            __version__, self.path, self.pkgs_dirs).encode('utf8'))
+        python_version = None
+        try:
+            entries = sorted(
+                os.scandir(str(self._path.joinpath('conda-meta'))),
+                key=lambda e: e.name
+            )
+        except OSError:
+            entries = []
+        for entry in entries:
+            st = entry.stat()
+            h.update('{0}\0{1}\0{2}\0'.format(
+                entry.name, st.st_mtime_ns, st.st_size).encode('utf8'))
+            parts = entry.name.rsplit('-', 2)
+            if parts[0] == 'python' and len(parts) == 3:
+                python_version = parts[1]
+        site_packages = self._site_packages_path(python_version)
+        if site_packages:
+            h.update(str(site_packages.stat().st_mtime_ns).encode('utf8'))
+        return h.hexdigest()
+
+    def _metadata_cache_path(self):
+        """The cache file for this environment, one per prefix"""
+        prefix = hashlib.sha256(self.path.encode('utf8')).hexdigest()[:16]
+        return self._cache_dir.joinpath(
+            '{0}-{1}.json'.format(self._path.stem, prefix))
+
+    def _read_metadata_cache(self, signature):
+        """
+        Returns the cached `(packages_info, name_map)` if they were stored
+        with `signature`, otherwise None.  Unreadable, malformed or stale
+        cache files are ignored.
+        """
+        try:
+            data = _json_loads(self._metadata_cache_path().read_bytes())
+        except Exception:
+            return None
+        if not isinstance(data, dict) or data.get('signature') != signature:
+            return None
+        info = data.get('packages')
+        name_map = data.get('name_map')
+        if not (isinstance(info, dict) and isinstance(name_map, dict)):
+            return None
+        if not all(isinstance(p, dict) for p in info.values()):
+            return None
+        return info, name_map
+
+    def _write_metadata_cache(self, signature):
+        """Stores the package metadata, ignoring any failure to write it"""
+        path = self._metadata_cache_path()
+        data = {
+            'signature': signature,
+            'packages': self._env_packages_info,
+            'name_map': self._env_packages_name_map
+        }
+        tmp = path.with_name('{0}.{1}.tmp'.format(path.name, os.getpid()))
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with tmp.open('w', encoding='utf8') as fp:
+                json.dump(data, fp)
+            os.replace(str(tmp), str(path))
+        except (OSError, TypeError, ValueError):
+            try:
+                tmp.unlink()
+            except OSError:
+                pass
+
+    def refresh_env_json(self):
+        """
+        Clears the cached environment specs so the next call to
+        `get_conda_env_json` reads them from Conda again.
+        """
+        self._env_json = None
+        self._pypi_dist_info = None
+        self._pkgs_index = None
 
     def load_package_metadata(self):
         """
@@ -172,77 +596,171 @@ class CondaEnvironment:
         metadata file to parse.
 
         Note: this will fail entirely if `conda clean` has been run.
+
+        The metadata files are read concurrently in a thread pool; the results
+        are then stored in order on the calling thread.  The environment specs
+        are re-read on each call; the package info is built from copies of
+        those records, so `get_conda_env_json` still returns Conda's records.
         """
-        for pkg in self.get_conda_env_json():
-            name = pkg.get('name')
-            simple = self._norm(name)
+        # pick up any changes made to the environment since the last load
+        self.refresh_env_json()
+        signature = None
+        if self._cache_dir is not None:
+            signature = self._metadata_signature()
+            cached = self._read_metadata_cache(signature)
+            if cached is not None:
+                self._env_packages_info, self._env_packages_name_map = cached
+                self._finish_metadata_load()
+                return
+
+        pkgs = self.get_conda_env_json()
+        needs_pypi = any(pkg.get('channel') == 'pypi' for pkg in pkgs)
+        if needs_pypi and self._pypi_dist_info is None:
+            # build the dist-info index once, before the threads need it
+            self._pypi_dist_info = self._index_pypi_dist_info()
+        if self._pkgs_index is None:
+            self._pkgs_index = self._index_pkgs_dirs()
+        if pkgs:
+            with ThreadPoolExecutor(max_workers=min(8, len(pkgs))) as ex:
+                results = list(ex.map(self._read_package_metadata, pkgs))
+        else:
+            results = []
+
+        for p_info in results:
+            name = p_info.get('name')
+            simple = p_info.get('simple_name')
             self._env_packages_name_map.setdefault(name, name)
             self._env_packages_name_map.setdefault(simple, name)
-
-            if pkg.get('channel') != 'pypi':
-                p_info = self.read_conda_metadata(pkg)
-            else:
-                p_info = self.read_pypi_metadata(pkg)
-
-            deps =  self._clean_requirments(p_info.get('depends', []))
-            p_info['depends'] = deps
-            p_info['simple_name'] = simple
             self._env_packages_info[name] = p_info
+        if signature is not None:
+            self._write_metadata_cache(signature)
+        self._finish_metadata_load()
+
+    def _finish_metadata_load(self):
+        """Builds the lookups derived from the loaded package metadata"""
+        self._env_packages_info_view = self._build_env_packages_info()
+        # warm the name lookups now that every package name is known
+        self._conda_name_cache = {
+            k: self._env_packages_name_map.get(self._norm(k), '')
+            for k in self._env_packages_name_map
+        }
+
+    def _read_package_metadata(self, pkg):
+        """
+        Reads the Conda or PyPi metadata for a single package and cleans up
+        its dependencies.  Does not modify the environment's state, so it is
+        safe to run from worker threads.
+        """
+        # the readers return copies, so the `get_conda_env_json` record is
+        # left as is
+        if pkg.get('channel') != 'pypi':
+            p_info = self.read_conda_metadata(pkg)
+        else:
+            p_info = self.read_pypi_metadata(pkg)
+
+        deps = self._clean_requirments_list(p_info.get('depends', []))
+        p_info['depends'] = deps
+        p_info['simple_name'] = self._norm(pkg.get('name'))
+        return p_info
 
     def read_conda_metadata(self, pkg):
         """
         Search for the package's index.json file in the Conda `pkgs_dirs`
-        locations.  Returns a copy of `pkg` with the updated metadata. 
+        locations.  Returns a copy of `pkg` with the updated metadata.
 
         :pkg: [dict] the package metadata, must include `dist_name`
 
         :returns: [dict] the package metadata including the Conda metadata.
         """
-        paths = [
-            d.joinpath(pkg['dist_name'], 'info', 'index.json')
-            for d in self._pkgs_dirs
-        ]
+        if self._pkgs_index is None:
+            self._pkgs_index = self._index_pkgs_dirs()
         # TODO: add/open archive files
         out = pkg.copy()
-        for p in paths:
-            if not p.exists():
+        for pkg_dir in self._pkgs_index.get(pkg['dist_name'], ()):
+            p = pkg_dir.joinpath('info', 'index.json')
+            try:
+                items = _load_index_json(str(p), p.stat().st_mtime_ns)
+            except OSError:
+                # e.g. a partially extracted package, try the next location
                 continue
-            with p.open('r', encoding='utf8') as fp:
-                out.update(json.load(fp))
+            # the cached values are shared, give the record its own lists
+            out.update((k, _copy_json(v)) for k, v in items)
             out.setdefault('conda_metadata_path', str(p))
             # just return the first hit
             return out
         return out
 
+    def _index_pkgs_dirs(self):
+        """
+        Maps the names of the extracted package directories to every
+        `pkgs_dirs` location they are found in, in `pkgs_dirs` order.
+        """
+        index = {}
+        for d in self._pkgs_dirs:
+            try:
+                entries = os.scandir(str(d))
+            except OSError:
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        index.setdefault(entry.name, []).append(
+                            pathlib.Path(entry.path))
+        return index
+
     def get_pypi_pkg_path(self, pkg):
         """
-        This modifies the `pkg` in-place if the name has a dash.
-        Returns the path to the PyPi metadata file or None.
+        Returns the path to the PyPi metadata file or None.  The site-packages
+        directory is scanned once and the `.dist-info` directories indexed,
+        so each lookup is a dictionary hit.
 
         :pkg: [dict] the package metadata, must include `name` and `version`
 
         :returns: [pathlib.Path|None]
         """
-        pkg_name = pkg.get('name')
-        pkg_version = pkg.get('version')
-        # can't have a dash in the package directory, normally an underscore,
-        # but occassionally some moron uses a dot
-        for c in '_.':
-            name = pkg_name.replace('-', c)
-            path = self._path.joinpath(
-                'Lib', 
-                'site-packages', 
-                '{0}-{1}.dist-info'.format(name, pkg_version),
-                'METADATA'
-            )
-            if path.exists():
-                return path
+        if self._pypi_dist_info is None:
+            self._pypi_dist_info = self._index_pypi_dist_info()
+        path = self._pypi_dist_info.get(
+            self._dist_info_key(pkg.get('name'), pkg.get('version'))
+        )
+        if path and path.is_file():
+            return path
         return None
 
+    def _index_pypi_dist_info(self):
+        """Maps the `.dist-info` directories in site-packages to METADATA"""
+        python = self._get_env_json_record('python')
+        site_packages = self._site_packages_path(python.get('version'))
+        index = {}
+        if not site_packages:
+            return index
+        for entry in os.scandir(str(site_packages)):
+            if not entry.name.endswith('.dist-info'):
+                continue
+            name, _, version = entry.name[:-len('.dist-info')].partition('-')
+            key = self._dist_info_key(name, version)
+            index[key] = pathlib.Path(entry.path, 'METADATA')
+        return index
+
+    def _get_env_json_record(self, name):
+        """Returns the `conda list` record for `name`, or an empty dict"""
+        for pkg in self.get_conda_env_json():
+            if pkg.get('name') == name:
+                return pkg
+        return {}
+
+    @staticmethod
+    def _dist_info_key(name, version):
+        # the directory name can't have a dash, normally it is an underscore,
+        # but occassionally some moron uses a dot
+        return '{0}-{1}'.format(
+            _PYPI_NAME_RE.sub('_', str(name)).lower(), version)
+
     def read_pypi_metadata(self, pkg):
         """
-        Search for a PyPi package's METADATA file in the Lib/site-packages
-        directory of the environment.
+        Search for a PyPi package's METADATA file in the site-packages
+        directory of the environment.  Returns a copy of `pkg` with the
+        updated metadata.
 
         :pkg: [dict] the package metadata, must include `name` and `version`
 
@@ -256,43 +774,42 @@ class CondaEnvironment:
         })
         if not path:
             return out
-        with path.open('r', encoding='utf8') as fp:
-            for line in fp:
-                line = line.strip()
-                # separate conditions to clean up multiline elif
-                condition1 = line.startswith('Requires-Python')
-                condition2 = (
-                    line.startswith('Requires-Dist') 
-                    and 'extra==' not in line.replace(' ', '')
-                )
-                condition3 = not line
-
-                if condition1:
-                    reqs = line.split(':')[-1].replace(' ', '')
-                    out.get('depends').append('python ' + reqs)
-                elif condition2:
-                    reqs = line.split(':')[-1].split(';')[0]
-                    reqs = reqs.replace('(', '').replace(')', '').strip()
-                    out.get('depends').append(reqs)
-                elif condition3:
-                    break
+        # only the header block is needed, which ends at the first blank line
+        with path.open('rb') as fp:
+            header = b''.join(takewhile(bytes.strip, fp))
+        depends = out.get('depends')
+        for m in _PYPI_REQ_RE.finditer(header):
+            kind = m.group(1)
+            reqs = m.group(2).decode('utf8').strip()
+            if kind == b'Python':
+                depends.append('python ' + reqs.replace(' ', ''))
+                continue
+            req, sep, marker = reqs.partition(';')
+            # only requirements gated on an extra are skipped
+            if sep and 'extra==' in marker.replace(' ', ''):
+                continue
+            depends.append(req.replace('(', '').replace(')', '').strip())
         out['pypi_metadata_path'] = str(path)
         return out
 
-    def _clean_requirments(self, reqs):
-        """Clean up the requirements dicts"""
-        if isinstance(reqs, dict):
-            return reqs
+    def _clean_requirments_list(self, reqs_list):
+        """Convert a list of requirement strings to a name: spec dict"""
         reqs_dict = {}
-        for req in reqs:
-            k, *v = req.split(' ', 1)
-            reqs_dict.setdefault(self._norm(k), ''.join(v))
+        for req in reqs_list:
+            parts = req.split(' ', 1)
+            reqs_dict.setdefault(
+                self._norm(parts[0]), parts[1] if len(parts) > 1 else '')
         return reqs_dict
 
     def _conda_name(self, pkg_name):
         """Attempt to find the name Conda uses for `pkg_name`"""
+        try:
+            return self._conda_name_cache[pkg_name]
+        except KeyError:
+            pass
         simple = self._norm(pkg_name)
         name = self._env_packages_name_map.get(simple, '')
+        self._conda_name_cache[pkg_name] = name
         return name
 
     def get_package(self, pkg_name):
@@ -301,9 +818,10 @@ class CondaEnvironment:
 
         :pkg_name: [str] the name of the package.
 
-        :returns: [dict] dictionary of the package metadata.
+        :returns: [dict] a copy of the package metadata, safe to modify.
         """
-        return self.env_packages_info.get(self._conda_name(pkg_name), {})
+        pkg = self.env_packages_info.get(self._conda_name(pkg_name), {})
+        return {k: _copy_json(v) for k, v in pkg.items()}
 
     def build_graph(self):
         """
@@ -318,8 +836,9 @@ class CondaEnvironment:
                             include=None, 
                             exclude=None, 
                             add_exclusion_deps=False,
-                            how='full',
-                            add_builds=False):
+                            how=How.FULL,
+                            add_builds=False,
+                            export_fp=None):
         """
         Builds a minified version of the requirements spec in YAML format.
 
@@ -341,7 +860,7 @@ class CondaEnvironment:
             ``exclude=['pandas'], add_exclusion_deps=True`` removes 'pandas' 
             from the spec, but adds 'numpy', 'python_dateutil', and 'pytz', 
             the next level of dependencies for pandas.
-        :how: [str|bool]
+        :how: [How|str]
             Controls how the version for each package is formatted. 
             Allowed values are: 
               'full' - Include the exact version
@@ -351,8 +870,11 @@ class CondaEnvironment:
         :add_builds: [bool]
             Add the build number to the requirment, highly specific and will 
             override loosening of version requirements.
+        :export_fp: [file-like]
+            An open text file to stream the YAML into.  When passed,
+            `export_path` is ignored and nothing is returned.
 
-        :returns: [str]
+        :returns: [str|None]
             The YAML string for the environment spec.
         """
         # convert strings to lists, None to empty
@@ -364,22 +886,27 @@ class CondaEnvironment:
             include = []
         if not exclude:
             exclude = []
-        include = set(c for c in map(self._conda_name, include) if c)
-        exclude = set(c for c in map(self._conda_name, exclude) if c)
+        include = {self._conda_name(c) for c in set(include)} - {''}
+        exclude = {self._conda_name(c) for c in set(exclude)} - {''}
+        # the graph nodes are already simple names, so they map straight to
+        # the Conda names
+        name_map = self._env_packages_name_map
         # add dependencies to the inclusions
         if add_exclusion_deps:
             for e in exclude:
-                include.update(self.conda_graph.get_package_dependencies(e))
+                deps = self.conda_graph.get_package_dependencies(self._norm(e))
+                include.update(name_map.get(d, '') for d in deps or ())
+            include.discard('')
 
-        req_names = set(map(self._conda_name, 
-            self.conda_graph.highest_dependents()))
-        req_names = req_names.union(include).difference(exclude)
+        req_names = {
+            name_map.get(k, '') for k in self.conda_graph.highest_dependents()
+        }
+        req_names |= include
+        req_names -= exclude
         req_data = {k: self._env_packages_info[k] for k in req_names}
 
         env_data = self._construct_env_reqs(req_data)
-        use_version = how.lower() != 'none'
-        conda_str = req_yaml_template(False, use_version, add_builds)
-        pip_str = req_yaml_template(True, use_version, add_builds)
+        how = How.parse(how)
 
         yaml_data = {
             'name': self.name,
@@ -388,31 +915,21 @@ class CondaEnvironment:
         }
 
         dependencies = yaml_data.get('dependencies')
-        for name, pkg in env_data.get('conda_deps').items():
-            version = format_version(pkg.get('version'), how)
-            dependencies.append(
-                conda_str.format(name=name, version=version, 
-                    build_string=pkg.get('build_string'))
-            )
-        
-        dependencies_pip = []
-        for name, pkg in env_data.get('pip_deps').items():
-            version = format_version(pkg.get('version'), how)
-            dependencies_pip.append(
-                pip_str.format(name=name, version=version)
-            )
+        dependencies.extend(self._render_deps(
+            env_data.get('conda_deps'), {}, how, False, add_builds))
+        dependencies_pip = self._render_deps(
+            env_data.get('pip_deps'), {}, how, True, add_builds)
         if dependencies_pip:
             dependencies.append({'pip': dependencies_pip})
 
-        yaml_str = yaml.dump(yaml_data, sort_keys=False)
-        self._exporter(export_path, yaml_str)
-        return yaml_str
+        return self._export_yaml(yaml_data, export_path, export_fp)
 
     def relax_requirements(self, 
                            export_path=None, 
-                           how='minor', 
+                           how=How.MINOR, 
                            pin=None, 
-                           override=None):
+                           override=None,
+                           export_fp=None):
         """
         Builds a requirement YAML for the entire environment with relaxed 
         requirements.
@@ -420,7 +937,7 @@ class CondaEnvironment:
         :export_path: [str|Path]
             The file path to write the minified requirements. If not passed,
             no file is written.
-        :how: [str|bool]
+        :how: [How|str]
             The default method for how the requirements will be relaxed.  Using
             the `pin` or `override` arguments takes precedence over this value.
               'full' - Include the exact version
@@ -435,8 +952,11 @@ class CondaEnvironment:
             Keys are the package names; values are the `how` methods to use for
             that specific package.  The same package cannot be listed in `pin`
             and `override`.  Packages not in the environment are ignored.
+        :export_fp: [file-like]
+            An open text file to stream the YAML into.  When passed,
+            `export_path` is ignored and nothing is returned.
 
-        :returns: [str]
+        :returns: [str|None]
             The YAML string with relaxed requirements.
         """
         if isinstance(pin, str):
@@ -459,9 +979,10 @@ class CondaEnvironment:
                     '`override`.  Only one of these methods can be used per '
                     'package.'.format(p)
                 )
+        how = How.parse(how)
         how_dict = {p: how for p in self.env_packages}
-        how_dict.update({p: 'full' for p in pin})
-        how_dict.update(override)
+        how_dict.update({p: How.FULL for p in pin})
+        how_dict.update({p: How.parse(h) for p, h in override.items()})
 
         env_data = self._construct_env_reqs(self.env_packages_info)
         conda_deps = env_data.get('conda_deps', {})
@@ -473,26 +994,38 @@ class CondaEnvironment:
         }
 
         dependencies = yaml_data.get('dependencies')
-        for name, pkg in conda_deps.items():
-            h = how_dict.get(name, 'false')
-            use_version = how.lower() != 'none'
-            req_str = req_yaml_template(False, use_version)
-            version = format_version(pkg.get('version'), h)
-            dependencies.append(req_str.format(name=name, version=version))
-
-        dependencies_pip = []
-        for name, pkg in pip_deps.items():
-            h = how_dict.get(name, 'false')
-            use_version = how.lower() != 'none'
-            req_str = req_yaml_template(True, use_version)
-            version = format_version(pkg.get('version'), h)
-            dependencies_pip.append(req_str.format(name=name, version=version))
+        dependencies.extend(
+            self._render_deps(conda_deps, how_dict, how, False))
+        dependencies_pip = self._render_deps(pip_deps, how_dict, how, True)
         if dependencies_pip:
             dependencies.append({'pip': dependencies_pip})
             
-        yaml_str = yaml.dump(yaml_data, sort_keys=False)
-        self._exporter(export_path, yaml_str)
-        return yaml_str
+        return self._export_yaml(yaml_data, export_path, export_fp)
+
+    def _render_deps(self, deps, how_dict, how, pip, add_builds=False):
+        """
+        Formats the YAML requirement lines for a set of packages.
+
+        :deps: [dict] mapping of package name to PkgReq.
+        :how_dict: [dict] per-package `How` values, falling back to `how`.
+        :how: [How] the default version formatting method.
+        :pip: [bool] whether the lines are for the pip section.
+        :add_builds: [bool] whether to include the build strings.
+
+        :returns: [list] the requirement strings.
+        """
+        with_version = req_yaml_template(pip, True, add_builds)
+        without_version = req_yaml_template(pip, False, add_builds)
+        lines = []
+        for name, pkg in deps.items():
+            h = how_dict.get(name, how)
+            req_str = without_version if h is How.NONE else with_version
+            lines.append(req_str.format(
+                name=name, 
+                version=format_version(pkg.version, h),
+                build_string=pkg.build_string
+            ))
+        return lines
 
     def _construct_env_reqs(self, packages):
         """
@@ -501,34 +1034,27 @@ class CondaEnvironment:
 
         :packages: [dict] package name key; package info values
 
-        :returns: [dict] 
+        :returns: [dict] the `conda_deps` and `pip_deps` values map package
+            names to PkgReq tuples.
         """
-        conda_deps = {
-            name: {
-                'version': pkg.get('version'),
-                'build_string': pkg.get('build_string'),
-                'channel': pkg.get('channel')
-            }
-            for name, pkg in packages.items()
-            if pkg.get('channel') != 'pypi'
-        }
-        
-        pip_deps = {
-            name: {
-                'version': pkg.get('version'),
-                'build_string': pkg.get('build_string'),
-                'channel': pkg.get('channel')
-            }
-            for name, pkg in packages.items()
-            if pkg.get('channel') == 'pypi'
-        }
+        conda_deps = {}
+        pip_deps = {}
+        for name, pkg in packages.items():
+            channel = pkg.get('channel')
+            target = pip_deps if channel == 'pypi' else conda_deps
+            target[name] = PkgReq(
+                pkg.get('version'),
+                pkg.get('build_string'),
+                channel
+            )
 
-        # set default channels first i guess?
+        # defaults first, then the other channels in a stable order
         channels = set(
-            self._to_default(d.get('channel')) 
+            self._to_default(d.channel) 
             for d in conda_deps.values()
         )
-        channels = sorted(channels, key=lambda x: x!='defaults')
+        others = sorted(c for c in channels if c != 'defaults')
+        channels = (['defaults'] if 'defaults' in channels else []) + others
 
         env_data = {
             'name': self.name,
@@ -544,9 +1070,33 @@ class CondaEnvironment:
             return 'defaults'
         return c
 
+    def _export_yaml(self, yaml_data, export_path=None, export_fp=None):
+        """
+        Dumps `yaml_data` to YAML.  When `export_fp` is passed the YAML is
+        streamed directly into it and None is returned; otherwise the YAML
+        string is returned and written to `export_path` if passed.
+
+        Specs made only of plain scalars are written directly, anything else
+        goes through `yaml.dump`.
+        """
+        yaml_str = _fast_yaml_dump(yaml_data)
+        if export_fp is not None:
+            if yaml_str is None:
+                yaml.dump(yaml_data, export_fp, Dumper=_YamlDumper,
+                    sort_keys=False)
+            else:
+                export_fp.write(yaml_str)
+            return None
+        if yaml_str is None:
+            yaml_str = yaml.dump(
+                yaml_data, Dumper=_YamlDumper, sort_keys=False)
+        self._exporter(export_path, yaml_str)
+        return yaml_str
+
     def _exporter(self, export_path, x):
         if export_path:
-            with pathlib.Path(export_path).open('w') as fp:
+            with pathlib.Path(export_path).open(
+                    'w', buffering=1 << 16, encoding='utf8') as fp:
                 fp.write(x)
 
     @property
@@ -567,21 +1117,21 @@ class CondaEnvironment:
 
     @property
     def env_packages_info(self):
-        info_keys = (
-            'arch',
-            'build_string', 
-            'channel', 
-            'depends', 
-            #'name',
-            'platform', 
-            'simple_name',
-            'subdir', 
-            'version'
-        )
-        return {
-            name: {k: pkg.get(k, '') for k in info_keys}
+        """
+        The exported metadata for each package.  Built once per load of the
+        package metadata and shared between callers, so it is a read-only
+        mapping; use `get_package` for a copy that can be modified.
+        """
+        if self._env_packages_info_view is None:
+            self._env_packages_info_view = self._build_env_packages_info()
+        return self._env_packages_info_view
+
+    def _build_env_packages_info(self):
+        info_keys = self._INFO_KEYS
+        return MappingProxyType({
+            name: MappingProxyType({k: pkg.get(k, '') for k in info_keys})
             for name, pkg in self._env_packages_info.items()
-        }
+        })
 
     @property
     def env_packages_specs(self):
@@ -595,35 +1145,41 @@ class CondaEnvironment:
         ])
 
     @staticmethod
+    @lru_cache(maxsize=4096)
     def _norm(pkg_name):
         """Normalized a package name"""
-        return str(pkg_name).lower().replace('-', '_').replace('.', '_')
+        return str(pkg_name).lower().translate(_NORM_TRANS)
 
     @staticmethod
     def _parse_list_header(header):
-        path = pathlib.Path(
+        # some Conda versions print notices before the header line
+        prefix = '# packages in environment at'
+        line = next(
+            (l for l in header.splitlines() if l.startswith(prefix)),
             header.split('\n')[0]
-                  .replace('# packages in environment at', '')
-                  .strip(': ')
+        )
+        path = pathlib.Path(
+            line.replace(prefix, '').strip(': ')
         ).absolute()
         return path
 
 
 class CondaGraph(DirectedAcyclicGraph):
+    __slots__ = ()
 
     def lowest_dependencies(self):
         """
         Returns a list of the packages which do not depend on any other 
         package in the environment.  These are the roots of the graph.
         """
-        return [k for k in self._inward if not self._outward.get(k)]
+        return list(self._roots)
 
     def highest_dependents(self):
         """
         Returns a list of packages which are not a dependency for another
         package in the environment.  These are the leaves of the graph.
         """
-        return [k for k in self._outward if not self._inward.get(k)]
+        return list(self._leaves)
 
     def get_package_dependencies(self, pkg_name):
         """
@@ -633,29 +1189,33 @@ class CondaGraph(DirectedAcyclicGraph):
 
     def get_package_dependency_tree(self, pkg_name, max_depth=15):
         """
-        Returns a hierarchy of all of the dependencies for the package.
+        Returns a hierarchy of all of the dependencies for the package.  Each
+        dependency is placed at the lowest level it is required at, i.e. its
+        longest dependency chain from the package, counting only chains of at
+        most `max_depth` links.  Dependencies that can only be reached through
+        longer chains are left out.
         """
-        if pkg_name not in self:
-            return {}
-        
         node = self._norm(pkg_name)
+        if node not in self:
+            return {}
+
+        # walk the graph one level at a time, each pass moving the packages
+        # it reaches down to that level
+        levels = {node: 0}
+        frontier = {node}
+        for depth in range(1, max_depth + 1):
+            frontier = {
+                dep for n in frontier for dep in self._outward.get(n, ())
+            }
+            if not frontier:
+                break
+            for dep in frontier:
+                levels[dep] = depth
+
         out = defaultdict(set)
-        out[0].add(node)
-        dep_lvls = {}
-            
-        for depth in range(max_depth):
-            for node in out.get(depth, set()).copy():
-                deps = self.get_package_dependencies(node)
-                if deps:
-                    out[depth + 1].update(deps)
-                # move all dependencies to lowest required level
-                for dep in deps:
-                    if dep in dep_lvls:
-                        lvl = dep_lvls.get(dep)
-                        out[lvl].discard(dep)
-                # update latest level
-                dep_lvls.update({dep: depth+1 for dep in deps})
-        return dict(out)
+        for n, lvl in levels.items():
+            out[lvl].add(n)
+        return dict(sorted(out.items()))
 
 
 class CondaImportError(ImportError):
@@ -2,6 +2,7 @@ class DirectedGraph:
     """
     A simple unweighted directed graph.  
     """
+    __slots__ = ('_outward', '_inward', '_leaves', '_roots')
 
     def __init__(self):
         """
@@ -10,6 +11,10 @@ class DirectedGraph:
         """
         self._outward = {}
         self._inward = {}
+        # nodes without inward edges (leaves) and outward edges (roots), kept
+        # up to date as nodes and edges are added
+        self._leaves = set()
+        self._roots = set()
 
     def __repr__(self):
         n = self.__class__.__name__
@@ -34,6 +39,8 @@ class DirectedGraph:
             return node
         self._outward.setdefault(node, set())
         self._inward.setdefault(node, set())
+        self._leaves.add(node)
+        self._roots.add(node)
         return node
 
     def add_edge(self, source, dest):
@@ -47,6 +54,8 @@ class DirectedGraph:
         d_node = self.add_node(dest)
         self._outward[s_node].add(d_node)
         self._inward[d_node].add(s_node)
+        self._leaves.discard(d_node)
+        self._roots.discard(s_node)
         return s_node, d_node
 
     def has_node(self, node):
@@ -75,26 +84,37 @@ class DirectedGraph:
     def find_path(self, start, end, path=None):
         """
         Finds the first available path from start to end; not always the 
-        shortest.
-        """
-        if not path:
-            path = []
-        path = path + [start]
-        if start == end:
-            return path
-        if not self._outward[start]:
-            return []
-        for node in self._outward[start]:
-            if node not in path:
-                newpath = self.find_path(node, end, path)
-                if newpath: 
-                    return newpath
+        shortest.  Returns None if there is no path.
+
+        `path` is an optional list of nodes already walked.  It is prepended
+        to the returned path and its nodes are not revisited.
+        """
+        prefix = list(path) if path else []
+        visited = set(prefix)
+        # iterative depth-first search, tracking each node's parent so the
+        # path is only built once the end is found
+        parents = {start: None}
+        stack = [start]
+        while stack:
+            node = stack.pop()
+            if node == end:
+                found = []
+                while node is not None:
+                    found.append(node)
+                    node = parents[node]
+                return prefix + found[::-1]
+            for nxt in self._outward.get(node, ()):
+                if nxt not in parents and nxt not in visited:
+                    parents[nxt] = node
+                    stack.append(nxt)
         return None
 
 class DirectedAcyclicGraph(DirectedGraph):
     """
     A simple unweighted directed acyclic graph.  
     """
+    __slots__ = ('_on_cycle',)
+
     def __init__(self, on_cycle='ignore'):
         """
         A DAG holds information about the directed connections between nodes, 
@@ -130,19 +150,78 @@ class DirectedAcyclicGraph(DirectedGraph):
 
         Returns: source_node, dest_node
         """
-        self.add_node(source)
-        self.add_node(dest)
-        if self._check_cycle(source, dest):
-            return super().add_edge(source, dest)
+        s_node = self.add_node(source)
+        d_node = self.add_node(dest)
+        # an existing edge cannot introduce a new cycle
+        if d_node in self._outward[s_node]:
+            return s_node, d_node
+        # the nodes are already normalized, don't redo it for each check
+        if self._check_cycle(s_node, d_node):
+            return super().add_edge(s_node, d_node)
         return None
 
+    def add_connections(self, source_name, dest_names):
+        """
+        Adds multiple connections from `source` to each dest in `dest_list`.
+        Edges that would create a cycle are handled by `on_cycle`, and give
+        None in place of the node pair.
+
+        Returns: [(source, dest), ...]
+        """
+        if not dest_names:
+            return []
+        s_node = self.add_node(source_name)
+        # an edge to any node that can reach the source closes a cycle;
+        # adding edges out of the source never changes that set, so it is
+        # found once for all of the destinations
+        ancestors = self._ancestors(s_node)
+        out = []
+        for dest_name in dest_names:
+            d_node = self.add_node(dest_name)
+            if d_node not in ancestors:
+                out.append(DirectedGraph.add_edge(self, s_node, d_node))
+            elif self.on_cycle == 'ignore':
+                out.append(None)
+            else:
+                self._check_cycle(s_node, d_node)
+        return out
+
+    def _ancestors(self, node):
+        """Returns the set of nodes that can reach `node`, including it"""
+        seen = {node}
+        stack = [node]
+        while stack:
+            for n in self._inward.get(stack.pop(), ()):
+                if n not in seen:
+                    seen.add(n)
+                    stack.append(n)
+        return seen
+
     def _detect_backedge(self, source, dest):
         """
         Returns True if adding an edge from `s` to `d` would create a 
         backedge which instantiate a cycle.
         """
-        # try to run a path from d to s, if connected, it would be a backedge 
-        return bool(self.find_path(dest, source))
+        # if s is reachable from d, the new edge would be a backedge
+        return self._reachable(self._norm(dest), self._norm(source))
+
+    def _reachable(self, start, end):
+        """
+        Returns True if `end` can be reached from `start`.  Runs an iterative
+        search with a visited set, so no paths are built.
+        """
+        if start == end:
+            return True
+        visited = {start}
+        stack = [start]
+        while stack:
+            for node in self._outward.get(stack.pop(), ()):
+                if node == end:
+                    return True
+                if node not in visited:
+                    visited.add(node)
+                    stack.append(node)
+        return False
 
     def _check_cycle(self, source, dest):
         c = self._detect_backedge(source, dest)
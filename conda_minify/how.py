@@ -0,0 +1,39 @@
+from enum import IntEnum
+
+
+class How(IntEnum):
+    """
+    The methods for how requirement versions are added to a spec.
+      FULL - Include the exact version
+      MAJOR - Include the major value of the version only ('1.*')
+      MINOR - Include the major and minor versions ('1.11.*')
+      NONE - Version not added.
+    """
+    FULL = 0
+    MAJOR = 1
+    MINOR = 2
+    NONE = 3
+
+    def __str__(self):
+        return self.name.lower()
+
+    @classmethod
+    def parse(cls, value):
+        """
+        Converts `value` to a How member.  Strings are matched to the member
+        names without regard to case.
+
+        :value: [How|str] the method to convert.
+
+        :returns: [How]
+        """
+        if isinstance(value, cls):
+            return value
+        try:
+            return cls[str(value).upper()]
+        except KeyError:
+            raise ValueError(
+                "Argument `how` only accepts the following values: {}".format(
+                    tuple(str(h) for h in cls)
+                )
+            ) from None
\ No newline at end of file
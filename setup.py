@@ -25,15 +25,13 @@ setup(
         'Topic :: Software Development :: Build Tools',
         'License :: OSI Approved :: MIT License',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.4',
-        'Programming Language :: Python :: 3.5',
         'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: 3.7',
         'Programming Language :: Python :: 3.8',
     ],
     keywords='conda virtual environment yaml',
     packages=['conda_minify'],
-    python_requires='>=3.4, <4',
+    python_requires='>=3.6, <4',
     install_requires=['conda>=4.3.0', 'pyyaml>3.0'],
     #data_files=[('', ['VERSION'])],
     entry_points={  # Optional